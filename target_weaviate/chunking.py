@@ -0,0 +1,138 @@
+"""Chunking of long text fields before vectorization."""
+
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+PARENT_UUID_PROPERTY = "parent_uuid"
+CHUNK_FIELD_PROPERTY = "chunk_field"
+CHUNK_INDEX_PROPERTY = "chunk_index"
+
+TOKEN_PATTERN = re.compile(r"\S+\s*")
+
+# long texts handed to each process pool task, to amortize pickling and IPC
+POOL_CHUNKSIZE = 16
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int = 0, unit: str = "character") -> list[str]:
+    """Split text into overlapping windows of characters or whitespace-delimited tokens.
+
+    This is the process pool entry point, so it must stay a picklable module-level function.
+    """
+    pieces = TOKEN_PATTERN.findall(text) if unit == "token" else text
+    step = chunk_size - chunk_overlap
+    chunks = []
+    for start in range(0, len(pieces), step):
+        window = pieces[start:start + chunk_size]
+        chunks.append(("".join(window) if unit == "token" else window).strip())
+        if start + chunk_size >= len(pieces):
+            break
+    return [chunk for chunk in chunks if chunk]
+
+
+def create_chunk_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    """Create the process pool shared by all streams for chunking.
+
+    Workers are spawned rather than forked, since the target process already
+    runs gRPC, drain and profiler threads that a forked child could deadlock on.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def is_text(value) -> bool:
+    """Return True for values a text vectorizer would embed."""
+    return isinstance(value, str) or (isinstance(value, list) and any(isinstance(item, str) for item in value))
+
+
+def chunk_uuid(parent_uuid: uuid.UUID, field: str, index: int) -> uuid.UUID:
+    """Generate a deterministic chunk uuid from its parent's uuid and position."""
+    key_string = f"{parent_uuid}:{field}:{index}"
+    return uuid.UUID(hashlib.md5(key_string.encode()).hexdigest())
+
+
+class Chunker:
+    """Splits configured text fields of records into chunk objects."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        fields: list[str],
+        chunk_size: int,
+        chunk_overlap: int = 0,
+        unit: str = "character",
+        *,
+        executor: ProcessPoolExecutor | None = None,
+        parent_properties: list[str] | None = None,
+    ) -> None:
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.executor = executor
+        self.parent_properties = set(parent_properties or ())
+
+    def split(self, records: list[dict]) -> list[dict[str, list[str]]]:
+        """Split each record's configured fields, sending only long texts to the process pool."""
+        split = [{} for _ in records]
+        split_long = partial(split_text, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap, unit=self.unit)
+
+        long_texts = []
+        for index, record in enumerate(records):
+            for field in self.fields:
+                text = record.get(field)
+                if not isinstance(text, str):
+                    continue
+                # a text no longer than chunk_size characters is at most one chunk in either unit
+                if self.executor is None or len(text) <= self.chunk_size:
+                    split[index][field] = split_long(text)
+                else:
+                    long_texts.append((index, field, text))
+
+        if long_texts:
+            texts = [text for _, _, text in long_texts]
+            for (index, field, _), field_chunks in zip(
+                long_texts, self.executor.map(split_long, texts, chunksize=POOL_CHUNKSIZE)
+            ):
+                split[index][field] = field_chunks
+        return split
+
+    def chunk(self, records: list[dict], uuids: list[uuid.UUID]) -> tuple[list[dict], list[uuid.UUID], dict]:
+        """Replace configured text fields with chunk objects.
+
+        Chunks carry the parent's non-text properties and any listed in
+        `parent_properties`; other parent text would be re-sent to the vectorizer
+        once per chunk. Returns the objects to write, their uuids, and the number
+        of chunks written for each parent uuid and field.
+        """
+        objects = []
+        object_uuids = []
+        chunk_counts = {}
+        for record, parent_uuid, record_chunks in zip(records, uuids, self.split(records)):
+            parent = {key: value for key, value in record.items() if key not in self.fields}
+            objects.append(parent)
+            object_uuids.append(parent_uuid)
+
+            shared = {
+                key: value
+                for key, value in parent.items()
+                if key in self.parent_properties or not is_text(value)
+            }
+            counts = chunk_counts.setdefault(parent_uuid, {})
+            for field in self.fields:
+                field_chunks = record_chunks.get(field, [])
+                counts[field] = len(field_chunks)
+                for index, text in enumerate(field_chunks):
+                    objects.append({
+                        **shared,
+                        field: text,
+                        PARENT_UUID_PROPERTY: str(parent_uuid),
+                        CHUNK_FIELD_PROPERTY: field,
+                        CHUNK_INDEX_PROPERTY: index,
+                    })
+                    object_uuids.append(chunk_uuid(parent_uuid, field, index))
+
+        return objects, object_uuids, chunk_counts
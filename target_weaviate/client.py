@@ -3,7 +3,10 @@
 from __future__ import annotations
 
 import weaviate
-from weaviate.classes.config import Configure, DataType, Property
+from weaviate.classes.config import Configure, ConsistencyLevel, DataType, Property
+from weaviate.classes.data import DataObject
+
+from target_weaviate.rate_limit import get_rate_limiter, is_rate_limit_error
 
 
 class WeaviateClient:
@@ -14,11 +17,17 @@ class WeaviateClient:
         weaviate_url: str,
         weaviate_api_key: str | None = None,
         logger=None,
+        *,
+        vectorizer_rate_limits: dict | None = None,
+        consistency_level: str | None = None,
     ) -> None:
         self.logger = logger
         self.weaviate_url = weaviate_url
         self.weaviate_api_key = weaviate_api_key
+        self.vectorizer_rate_limits = vectorizer_rate_limits or {}
+        self.consistency_level = consistency_level
         self._client = None
+        self._vectorizers: dict[str, str | None] = {}
 
     def connect(self) -> weaviate.WeaviateClient:
         if self._client:
@@ -53,11 +62,15 @@ class WeaviateClient:
         client = self.connect()
         return client.collections.exists(collection_name)
 
-    def create_collection(
+    def create_collection(  # noqa: PLR0913
         self,
         collection_name: str,
         properties: list[dict] | None = None,
         vectorizer: str | None = None,
+        *,
+        shard_count: int | None = None,
+        virtual_shards_per_physical: int | None = None,
+        replication_factor: int | None = None,
     ) -> None:
         client = self.connect()
 
@@ -73,32 +86,47 @@ class WeaviateClient:
             elif vectorizer == "none":
                 vectorizer_config = Configure.Vectorizer.none()
 
-        property_objects = []
-        if properties:
-            for prop in properties:
-                property_objects.append(
-                    Property(
-                        name=prop["name"],
-                        data_type=DataType[prop.get("data_type", "TEXT").upper()],
-                    )
-                )
-
-        if property_objects and vectorizer_config:
-            client.collections.create(
-                name=collection_name,
-                properties=property_objects,
-                vectorizer_config=vectorizer_config,
+        property_objects = [self._build_property(prop) for prop in properties or []]
+
+        create_kwargs = {}
+        if property_objects:
+            create_kwargs["properties"] = property_objects
+        if vectorizer_config:
+            create_kwargs["vectorizer_config"] = vectorizer_config
+        if shard_count or virtual_shards_per_physical:
+            create_kwargs["sharding_config"] = Configure.sharding(
+                desired_count=shard_count,
+                virtual_per_physical=virtual_shards_per_physical,
             )
-        elif property_objects:
-            client.collections.create(name=collection_name, properties=property_objects)
-        elif vectorizer_config:
-            client.collections.create(name=collection_name, vectorizer_config=vectorizer_config)
-        else:
-            client.collections.create(name=collection_name)
+        if replication_factor:
+            create_kwargs["replication_config"] = Configure.replication(factor=replication_factor)
+
+        client.collections.create(name=collection_name, **create_kwargs)
+
+        self._vectorizers[collection_name] = vectorizer
 
         if self.logger:
             self.logger.info(f"Collection '{collection_name}' created successfully")
 
+    def _build_property(self, prop: dict) -> Property:
+        return Property(
+            name=prop["name"],
+            data_type=DataType[prop.get("data_type", "TEXT").upper()],
+            skip_vectorization=prop.get("skip_vectorization", False),
+        )
+
+    def add_missing_properties(self, collection_name: str, properties: list[dict]) -> None:
+        """Declare properties an existing collection lacks, rather than leaving them to auto-schema."""
+        collection = self.get_collection(collection_name)
+        existing = {prop.name for prop in collection.config.get().properties}
+
+        for prop in properties:
+            if prop["name"] in existing:
+                continue
+            if self.logger:
+                self.logger.info(f"Adding property '{prop['name']}' to collection '{collection_name}'")
+            collection.config.add_property(self._build_property(prop))
+
     def delete_collection(self, collection_name: str) -> None:
         client = self.connect()
         if self.logger:
@@ -107,16 +135,101 @@ class WeaviateClient:
 
     def get_collection(self, collection_name: str):
         client = self.connect()
-        return client.collections.get(collection_name)
-
-    def batch_insert(self, collection_name: str, records: list[dict]) -> None:
+        collection = client.collections.get(collection_name)
+        if self.consistency_level:
+            collection = collection.with_consistency_level(ConsistencyLevel(self.consistency_level.upper()))
+        return collection
+
+    def get_collection_vectorizer(self, collection_name: str) -> str | None:
+        if collection_name not in self._vectorizers:
+            config = self.get_collection(collection_name).config.get()
+            vectorizer = config.vectorizer
+            self._vectorizers[collection_name] = getattr(vectorizer, "value", vectorizer)
+        return self._vectorizers[collection_name]
+
+    def get_rate_limiter(self, collection_name: str):
+        if not self.vectorizer_rate_limits:
+            return None
+
+        # collections created by this run are cached by create_collection, others are read from the server
+        vectorizer = self.get_collection_vectorizer(collection_name)
+        limits = self.vectorizer_rate_limits.get(vectorizer) if vectorizer else None
+        if not limits:
+            return None
+        return get_rate_limiter(vectorizer, limits)
+
+    def batch_insert(
+        self,
+        collection_name: str,
+        records: list[dict],
+        uuids: list | None = None,
+    ) -> None:
         collection = self.get_collection(collection_name)
+        uuids = uuids or [None] * len(records)
+
+        rate_limiter = self.get_rate_limiter(collection_name)
+        if rate_limiter:
+            self._paced_batch_insert(collection, records, uuids, rate_limiter)
+            return
+
         with collection.batch.dynamic() as batch:
-            for record in records:
-                batch.add_object(properties=record)
+            for record, object_uuid in zip(records, uuids):
+                batch.add_object(properties=record, uuid=object_uuid)
+
+    def _paced_batch_insert(self, collection, records: list[dict], uuids: list, rate_limiter) -> None:
+        # insert_many sends one request and never retries on its own, unlike the batch
+        # context managers, so every resend below goes through the rate limiter
+        pending = [
+            (record, object_uuid, rate_limiter.estimate_tokens(record))
+            for record, object_uuid in zip(records, uuids)
+        ]
+
+        for attempt in range(rate_limiter.max_retries + 1):
+            throttled = []
+            for chunk in rate_limiter.split(pending):
+                rate_limiter.acquire(sum(tokens for _, _, tokens in chunk))
+                result = collection.data.insert_many([
+                    DataObject(properties=record, uuid=object_uuid) for record, object_uuid, _ in chunk
+                ])
+
+                for index, error in result.errors.items():
+                    if is_rate_limit_error(error.message):
+                        throttled.append(chunk[index])
+                    elif self.logger:
+                        self.logger.error(f"Failed to write object {chunk[index][1]}: {error.message}")
+
+            if not throttled:
+                return
+
+            if attempt < rate_limiter.max_retries:
+                if self.logger:
+                    self.logger.warning(
+                        f"Vectorizer rate limit hit for {len(throttled)} objects, "
+                        f"backing off (attempt {attempt + 1}/{rate_limiter.max_retries})"
+                    )
+                rate_limiter.backoff(attempt)
+            pending = throttled
+
+        msg = f"{len(pending)} objects still rate limited after {rate_limiter.max_retries} retries"
+        raise RuntimeError(msg)
 
-    def count_objects(self, collection_name: str) -> int:
+    def count_objects(self, collection_name: str, where=None) -> int:
         collection = self.get_collection(collection_name)
-        aggregate = collection.aggregate.over_all(total_count=True)
+        aggregate = collection.aggregate.over_all(filters=where, total_count=True)
         return aggregate.total_count
 
+    def delete_objects(self, collection_name: str, where) -> int:
+        collection = self.get_collection(collection_name)
+        deleted = 0
+
+        # delete_many is capped by the server's QUERY_MAXIMUM_RESULTS, so page until nothing matches
+        while True:
+            result = collection.data.delete_many(where=where)
+            deleted += result.successful
+            if result.failed and self.logger:
+                self.logger.warning(f"Failed to delete {result.failed} objects from '{collection_name}'")
+            if result.matches == 0 or result.successful == 0:
+                break
+
+        return deleted
+
@@ -0,0 +1,53 @@
+"""Concurrent flushing of batches across streams."""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+
+# rough serialized size of a number, boolean, null or nested value
+SCALAR_BYTES = 8
+
+
+def estimate_bytes(record: dict) -> int:
+    """Estimate a record's serialized size from its keys and top-level values."""
+    size = 0
+    for name, value in record.items():
+        size += len(name)
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, list):
+            size += sum(len(item) if isinstance(item, str) else SCALAR_BYTES for item in value)
+        else:
+            size += SCALAR_BYTES
+    return size
+
+
+class InFlightBudget:
+    """Limits the bytes of batches being written at once across all streams."""
+
+    def __init__(self, max_bytes: int | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.in_flight_bytes = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, size: int) -> bool:
+        if self.in_flight == 0:
+            # a batch larger than the whole byte budget runs alone rather than never
+            return True
+        return self.max_bytes is None or self.in_flight_bytes + size <= self.max_bytes
+
+    @contextmanager
+    def reserve(self, size: int):
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(size))
+            self.in_flight += 1
+            self.in_flight_bytes += size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self.in_flight_bytes -= size
+                self._condition.notify_all()
@@ -0,0 +1,144 @@
+"""Profiling mode for the record hot path."""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+_session: ProfileSession | None = None
+
+
+def get_session() -> ProfileSession | None:
+    """Return the active profiling session, if profiling is enabled."""
+    return _session
+
+
+@contextmanager
+def profile_stream(stream_name: str):
+    """Attribute work done inside the block to a stream while profiling is active."""
+    if _session is None:
+        yield
+        return
+
+    _session.push(stream_name)
+    try:
+        yield
+    finally:
+        _session.pop()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+class ProfileSession:
+    """Collects per-stream deterministic profiles, sampled stacks and allocations."""
+
+    def __init__(self, output_dir: str, sample_interval: float = 0.005, logger=None) -> None:
+        self.output_dir = Path(output_dir)
+        self.sample_interval = sample_interval
+        self.logger = logger
+        self.profiles: dict[str, cProfile.Profile] = {}
+        self.allocations: dict[str, Counter] = {}
+        self.stacks: Counter = Counter()
+        self._streams: list[str] = []
+        self._snapshot = None
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        global _session  # noqa: PLW0603
+        tracemalloc.start()
+        self._snapshot = self._take_snapshot()
+        self._sampler.start()
+        _session = self
+
+    def stop(self) -> None:
+        global _session  # noqa: PLW0603
+        _session = None
+        self._stopped.set()
+        self._sampler.join()
+        while self._streams:
+            self.pop()
+        tracemalloc.stop()
+        self.write_reports()
+
+    def push(self, stream_name: str) -> None:
+        # only one profiler can be active at a time, so suspend the enclosing stream's
+        if self._streams:
+            self.profiles[self._streams[-1]].disable()
+        self._streams.append(stream_name)
+        self.profiles.setdefault(stream_name, cProfile.Profile()).enable()
+
+    def pop(self) -> None:
+        self.profiles[self._streams.pop()].disable()
+        if self._streams:
+            self.profiles[self._streams[-1]].enable()
+
+    def batch_boundary(self, stream_name: str) -> None:
+        """Record allocations made since the previous batch boundary."""
+        snapshot = self._take_snapshot()
+        allocations = self.allocations.setdefault(stream_name, Counter())
+        for stat in snapshot.compare_to(self._snapshot, "lineno"):
+            if stat.size_diff > 0:
+                frame = stat.traceback[0]
+                allocations[f"{frame.filename}:{frame.lineno}"] += stat.size_diff
+        self._snapshot = snapshot
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+            tracemalloc.Filter(inclusive=False, filename_pattern=__file__),
+        ))
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)  # noqa: SLF001
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            streams = self._streams
+            stack.append(streams[-1] if streams else "target")
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write_reports(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        for stream_name in sorted(set(self.profiles) | set(self.allocations)):
+            report = io.StringIO()
+            report.write(f"Stream: {stream_name}\n\n")
+            report.write(f"Top {TOP_FUNCTIONS} functions by cumulative time\n\n")
+            if stream_name in self.profiles:
+                stats = pstats.Stats(self.profiles[stream_name], stream=report)
+                stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+
+            report.write(f"Top {TOP_ALLOCATIONS} allocation sites by bytes allocated at batch boundaries\n\n")
+            for location, size in self.allocations.get(stream_name, Counter()).most_common(TOP_ALLOCATIONS):
+                report.write(f"{size / 1024:12.1f} KiB  {location}\n")
+
+            filename = re.sub(r"[^\w.-]", "_", stream_name)
+            (self.output_dir / f"{filename}.txt").write_text(report.getvalue())
+
+        with (self.output_dir / "stacks.collapsed").open("w") as stacks_file:
+            for stack, count in self.stacks.items():
+                stacks_file.write(f"{stack} {count}\n")
+
+        if self.logger:
+            self.logger.info(f"Wrote profiling reports to '{self.output_dir}'")
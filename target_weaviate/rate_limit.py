@@ -0,0 +1,171 @@
+"""Rate limiting for server-side vectorizers."""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+
+# rough chars-per-token ratio used by the OpenAI and Cohere tokenizers for English text
+CHARS_PER_TOKEN = 4
+
+RATE_LIMIT_MARKERS = (
+    "429",
+    "rate limit",
+    "ratelimit",
+    "too many requests",
+    "tokens per min",
+    "quota",
+)
+
+
+def estimate_tokens(properties: dict, text_fields: list[str] | None = None) -> int:
+    """Estimate the number of vectorizer tokens for an object's text properties."""
+    chars = 0
+    for name, value in properties.items():
+        if text_fields is not None and name not in text_fields:
+            continue
+        if isinstance(value, str):
+            chars += len(value)
+        elif isinstance(value, list):
+            chars += sum(len(item) for item in value if isinstance(item, str))
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+def is_rate_limit_error(message: str | None) -> bool:
+    """Return True if a batch error message reports a provider rate limit."""
+    if not message:
+        return False
+    message = message.lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, clock=None) -> None:
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._clock = clock or time.monotonic
+        self._updated_at = self._clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        # requests larger than the bucket are let through once it is full
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self) -> None:
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class VectorizerRateLimiter:
+    """Paces batch submission to stay under a vectorizer provider's quota."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        *,
+        text_fields: list[str] | None = None,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        clock=None,
+        sleep=None,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+        self.text_fields = text_fields
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._sleep = sleep or time.sleep
+        self._lock = threading.Lock()
+
+    def estimate_tokens(self, properties: dict) -> int:
+        return estimate_tokens(properties, self.text_fields)
+
+    def split(self, objects: list[tuple[dict, object, int]]) -> list[list[tuple[dict, object, int]]]:
+        """Split (properties, uuid, tokens) objects into chunks that fit the token bucket."""
+        if not self.tokens:
+            return [objects] if objects else []
+
+        chunks = []
+        chunk = []
+        chunk_tokens = 0
+        for obj in objects:
+            if chunk and chunk_tokens + obj[2] > self.tokens.capacity:
+                chunks.append(chunk)
+                chunk = []
+                chunk_tokens = 0
+            chunk.append(obj)
+            chunk_tokens += obj[2]
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def acquire(self, tokens: int) -> None:
+        """Block until one batch request carrying `tokens` tokens fits in the quota.
+
+        The request bucket counts batch requests sent to Weaviate. The server may
+        split one batch into several calls to the provider, so it does not track
+        the provider's own requests per minute.
+        """
+        with self._lock:
+            while True:
+                wait = 0.0
+                if self.requests:
+                    wait = max(wait, self.requests.wait_time(1))
+                if self.tokens:
+                    wait = max(wait, self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    break
+                self._sleep(wait)
+
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(tokens)
+
+    def backoff(self, attempt: int) -> None:
+        """Empty the buckets and sleep after the provider reported a rate limit."""
+        with self._lock:
+            if self.requests:
+                self.requests.drain()
+            if self.tokens:
+                self.tokens.drain()
+        self._sleep(min(60.0, self.backoff_seconds * 2**attempt))
+
+
+_limiters: dict[tuple, VectorizerRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(vectorizer: str, limits: dict) -> VectorizerRateLimiter:
+    """Return the process-wide limiter for a vectorizer, shared across streams."""
+    key = (
+        vectorizer,
+        limits.get("requests_per_minute"),
+        limits.get("tokens_per_minute"),
+        tuple(limits.get("text_fields") or ()),
+        limits.get("max_retries", 5),
+    )
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = VectorizerRateLimiter(
+                requests_per_minute=limits.get("requests_per_minute"),
+                tokens_per_minute=limits.get("tokens_per_minute"),
+                text_fields=limits.get("text_fields"),
+                max_retries=limits.get("max_retries", 5),
+            )
+        return _limiters[key]
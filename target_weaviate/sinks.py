@@ -7,8 +7,19 @@ import uuid
 
 from singer_sdk.helpers.capabilities import TargetLoadMethods
 from singer_sdk.sinks import BatchSink
-
+from weaviate.classes.query import Filter
+
+from target_weaviate.chunking import (
+    CHUNK_FIELD_PROPERTY,
+    CHUNK_INDEX_PROPERTY,
+    PARENT_UUID_PROPERTY,
+    Chunker,
+)
 from target_weaviate.client import WeaviateClient
+from target_weaviate.flush import estimate_bytes
+from target_weaviate.profiling import get_session, profile_stream
+
+SYNC_AND_PRUNE = "sync-and-prune"
 
 
 class WeaviateSink(BatchSink):
@@ -16,15 +27,39 @@ class WeaviateSink(BatchSink):
 
     max_size = 100
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
+    def __init__(self, target, *args, **kwargs) -> None:
+        super().__init__(target, *args, **kwargs)
+        self._chunk_pool = getattr(target, "chunk_pool", None)
         self._client = None
+        self._chunker = None
         self._collection_initialized = False
         self.collection_name = self.config.get("collection_name") or self.stream_name
+        self.sync_run_property = self.config.get("sync_run_property", "sync_run_id")
+        self.sync_stream_property = self.config.get("sync_stream_property", "sync_stream")
 
         if self.config.get("batch_size"):
             self.max_size = self.config["batch_size"]
 
+        if self.config.get("chunk_fields") and self.config.get("load_method") not in (
+            TargetLoadMethods.UPSERT,
+            SYNC_AND_PRUNE,
+        ):
+            msg = "chunk_fields requires load_method 'upsert' or 'sync-and-prune'"
+            raise ValueError(msg)
+
+        if self.config.get("chunk_fields"):
+            chunk_size = self.config.get("chunk_size", 2000)
+            chunk_overlap = self.config.get("chunk_overlap", 200)
+            if chunk_size < 1:
+                msg = "chunk_size must be at least 1"
+                raise ValueError(msg)
+            if not 0 <= chunk_overlap < chunk_size:
+                msg = (
+                    f"chunk_overlap must be at least 0 and smaller than chunk_size, "
+                    f"got chunk_overlap={chunk_overlap} and chunk_size={chunk_size}"
+                )
+                raise ValueError(msg)
+
     @property
     def client(self) -> WeaviateClient:
         if not self._client:
@@ -32,9 +67,24 @@ class WeaviateSink(BatchSink):
                 weaviate_url=self.config["weaviate_url"],
                 weaviate_api_key=self.config.get("weaviate_api_key"),
                 logger=self.logger,
+                vectorizer_rate_limits=self.config.get("vectorizer_rate_limits"),
+                consistency_level=self.config.get("consistency_level"),
             )
         return self._client
 
+    @property
+    def chunker(self) -> Chunker | None:
+        if not self._chunker and self.config.get("chunk_fields"):
+            self._chunker = Chunker(
+                fields=self.config["chunk_fields"],
+                chunk_size=self.config.get("chunk_size", 2000),
+                chunk_overlap=self.config.get("chunk_overlap", 200),
+                unit=self.config.get("chunk_unit", "character"),
+                executor=self._chunk_pool,
+                parent_properties=self._chunk_parent_properties(),
+            )
+        return self._chunker
+
     def _ensure_collection_initialized(self, sample_record: dict | None = None) -> None:
         if self._collection_initialized:
             return
@@ -55,16 +105,25 @@ class WeaviateSink(BatchSink):
                     f"The load_method is {TargetLoadMethods.OVERWRITE} but the collection is empty, not re-creating."
                 )
 
+        managed_properties = self._managed_properties()
+        if exists and managed_properties:
+            self.client.add_missing_properties(self.collection_name, managed_properties)
+
         if not exists:
             if self.config.get("create_collection_if_missing", True):
                 properties = None
                 if sample_record and self.schema:
                     properties = self._infer_properties_from_schema()
+                    if properties:
+                        properties.extend(managed_properties)
 
                 self.client.create_collection(
                     self.collection_name,
                     properties=properties,
                     vectorizer=self.config.get("vectorizer"),
+                    shard_count=self.config.get("shard_count"),
+                    virtual_shards_per_physical=self.config.get("virtual_shards_per_physical"),
+                    replication_factor=self.config.get("replication_factor"),
                 )
             else:
                 msg = (
@@ -77,6 +136,29 @@ class WeaviateSink(BatchSink):
 
         self._collection_initialized = True
 
+    def _managed_properties(self) -> list[dict]:
+        # bookkeeping properties must not end up in embeddings, and the run id must compare as an integer
+        properties = []
+        if self.config.get("load_method") == SYNC_AND_PRUNE:
+            properties.extend([
+                {"name": self.sync_run_property, "data_type": "INT"},
+                {"name": self.sync_stream_property, "data_type": "TEXT", "skip_vectorization": True},
+            ])
+        if self.chunker:
+            properties.extend([
+                {"name": PARENT_UUID_PROPERTY, "data_type": "UUID"},
+                {"name": CHUNK_FIELD_PROPERTY, "data_type": "TEXT", "skip_vectorization": True},
+                {"name": CHUNK_INDEX_PROPERTY, "data_type": "INT"},
+            ])
+        return properties
+
+    def _chunk_parent_properties(self) -> list[str]:
+        properties = list(self.config.get("chunk_parent_properties") or [])
+        if self.config.get("load_method") == SYNC_AND_PRUNE:
+            # chunks are pruned by stream like their parents
+            properties.append(self.sync_stream_property)
+        return properties
+
     def _infer_properties_from_schema(self) -> list[dict]:
         if not self.schema or "properties" not in self.schema:
             return None
@@ -115,16 +197,37 @@ class WeaviateSink(BatchSink):
 
         if "records" not in context:
             context["records"] = []
+            context["bytes"] = 0
 
         if self.config.get("add_record_metadata"):
             record.update(self.config["add_record_metadata"])
 
+        if self.config.get("load_method") == SYNC_AND_PRUNE:
+            record[self.sync_run_property] = self.sync_started_at
+            record[self.sync_stream_property] = self.stream_name
+
         context["records"].append(record)
+        context["bytes"] += estimate_bytes(record)
+
+    def pending_bytes(self) -> int:
+        """Estimate the serialized size of the batch waiting to be drained."""
+        context = self._pending_batch or {}
+        return context.get("bytes", 0)
 
     def process_batch(self, context: dict) -> None:
+        profiler = get_session()
+        if profiler is None:
+            self._process_batch(context)
+            return
+
+        with profile_stream(self.stream_name):
+            self._process_batch(context)
+        profiler.batch_boundary(self.stream_name)
+
+    def _process_batch(self, context: dict) -> None:
         records = context["records"]
 
-        if self.config.get("load_method") == TargetLoadMethods.UPSERT:
+        if self.config.get("load_method") in (TargetLoadMethods.UPSERT, SYNC_AND_PRUNE):
             self._batch_upsert(records)
         else:
             self._batch_insert(records)
@@ -136,31 +239,94 @@ class WeaviateSink(BatchSink):
     def _batch_upsert(self, records: list[dict]) -> None:
         primary_key = self.config.get("primary_key")
         if not primary_key:
-            msg = "primary_key must be specified when load_method is 'upsert'"
+            msg = f"primary_key must be specified when load_method is '{self.config.get('load_method')}'"
             raise ValueError(msg)
 
         self.logger.info(f"Upserting {len(records)} records into '{self.collection_name}'")
-        collection = self.client.get_collection(self.collection_name)
 
-        with collection.batch.dynamic() as batch:
-            for record in records:
-                key_values = {key: record.get(key) for key in primary_key if key in record}
+        keyed_records = []
+        uuids = []
+        for record in records:
+            key_values = {key: record.get(key) for key in primary_key if key in record}
+
+            if len(key_values) != len(primary_key):
+                self.logger.warning(
+                    f"Record missing primary key fields. "
+                    f"Expected: {primary_key}, Got: {list(key_values.keys())}"
+                )
+                continue
 
-                if len(key_values) != len(primary_key):
-                    self.logger.warning(
-                        f"Record missing primary key fields. "
-                        f"Expected: {primary_key}, Got: {list(key_values.keys())}"
-                    )
-                    continue
+            # generate deterministic uuid from primary key
+            key_string = ":".join(str(key_values[k]) for k in sorted(primary_key))
+            keyed_records.append(record)
+            uuids.append(uuid.UUID(hashlib.md5(key_string.encode()).hexdigest()))
 
-                # generate deterministic uuid from primary key
-                key_string = ":".join(str(key_values[k]) for k in sorted(primary_key))
-                deterministic_uuid = uuid.UUID(hashlib.md5(key_string.encode()).hexdigest())
+        chunk_counts = None
+        if self.chunker:
+            keyed_records, uuids, chunk_counts = self.chunker.chunk(keyed_records, uuids)
 
-                batch.add_object(properties=record, uuid=deterministic_uuid)
+        self.client.batch_insert(
+            self.collection_name,
+            keyed_records,
+            uuids=uuids,
+        )
+
+        if chunk_counts:
+            self._delete_orphaned_chunks(chunk_counts)
 
         self.logger.info(f"Batch upsert completed for {len(records)} records")
 
+    def _delete_orphaned_chunks(self, chunk_counts: dict) -> None:
+        # chunks past the new chunk count are left over from the parent's previous version
+        where = Filter.any_of([
+            Filter.by_property(PARENT_UUID_PROPERTY).equal(str(parent_uuid))
+            & Filter.by_property(CHUNK_FIELD_PROPERTY).equal(field)
+            & Filter.by_property(CHUNK_INDEX_PROPERTY).greater_or_equal(count)
+            for parent_uuid, counts in chunk_counts.items()
+            for field, count in counts.items()
+        ])
+        deleted = self.client.delete_objects(self.collection_name, where)
+        if deleted:
+            self.logger.info(f"Deleted {deleted} orphaned chunks from '{self.collection_name}'")
+
+    def prune_stale_objects(self) -> None:
+        """Delete this stream's objects written by an earlier sync run.
+
+        Only objects tagged with this stream's name are considered, so streams sharing
+        a collection never prune each other. Objects without a run id or stream name,
+        such as those loaded before switching to sync-and-prune, are left untouched.
+        """
+        if not self._collection_initialized:
+            return
+
+        written_by_stream = Filter.by_property(self.sync_stream_property).equal(self.stream_name)
+        where = written_by_stream & Filter.by_property(self.sync_run_property).less_than(self.sync_started_at)
+        stale = self.client.count_objects(self.collection_name, where=where)
+        if stale == 0:
+            self.logger.info(f"No stale objects to prune from '{self.collection_name}'")
+            return
+
+        total = self.client.count_objects(self.collection_name, where=written_by_stream)
+        if self.config.get("prune_dry_run"):
+            self.logger.info(
+                f"Dry run: would prune {stale} of {total} objects for stream '{self.stream_name}' "
+                f"from '{self.collection_name}'"
+            )
+            return
+
+        max_fraction = self.config.get("prune_max_fraction", 0.5)
+        if total and stale / total > max_fraction:
+            self.logger.warning(
+                f"Not pruning '{self.collection_name}': {stale} of {total} objects for stream "
+                f"'{self.stream_name}' are stale, which exceeds prune_max_fraction of {max_fraction}"
+            )
+            return
+
+        deleted = self.client.delete_objects(self.collection_name, where)
+        self.logger.info(
+            f"Pruned {deleted} stale objects for stream '{self.stream_name}' from '{self.collection_name}'"
+        )
+
     def clean_up(self) -> None:
         if self._client:
             self._client.close()
@@ -2,10 +2,17 @@
 
 from __future__ import annotations
 
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+
 from singer_sdk import typing as th
+from singer_sdk.helpers.capabilities import TargetLoadMethods
 from singer_sdk.target_base import Target
 
-from target_weaviate.sinks import WeaviateSink
+from target_weaviate.chunking import create_chunk_pool
+from target_weaviate.flush import InFlightBudget
+from target_weaviate.profiling import ProfileSession, profile_stream
+from target_weaviate.sinks import SYNC_AND_PRUNE, WeaviateSink
 
 
 class TargetWeaviate(Target):
@@ -33,6 +40,24 @@ class TargetWeaviate(Target):
             required=False,
             description="Weaviate collection name. If not provided, uses the stream name.",
         ),
+        th.Property(
+            "load_method",
+            th.StringType,
+            required=False,
+            default=TargetLoadMethods.APPEND_ONLY,
+            allowed_values=[
+                TargetLoadMethods.APPEND_ONLY,
+                TargetLoadMethods.UPSERT,
+                TargetLoadMethods.OVERWRITE,
+                SYNC_AND_PRUNE,
+            ],
+            description=(
+                "The method to use when loading data into the collection: "
+                "'append-only', 'upsert', 'overwrite' or 'sync-and-prune'. "
+                "'sync-and-prune' upserts records and then deletes objects "
+                "that were not written by the current run."
+            ),
+        ),
         th.Property(
             "primary_key",
             th.ArrayType(th.StringType),
@@ -73,10 +98,231 @@ class TargetWeaviate(Target):
             default=True,
             description="Automatically create the collection if it doesn't exist.",
         ),
+        th.Property(
+            "shard_count",
+            th.IntegerType,
+            required=False,
+            description="Desired number of physical shards when creating a new collection.",
+        ),
+        th.Property(
+            "virtual_shards_per_physical",
+            th.IntegerType,
+            required=False,
+            description="Number of virtual shards per physical shard when creating a new collection.",
+        ),
+        th.Property(
+            "replication_factor",
+            th.IntegerType,
+            required=False,
+            description="Replication factor when creating a new collection.",
+        ),
+        th.Property(
+            "consistency_level",
+            th.StringType,
+            required=False,
+            allowed_values=["ONE", "QUORUM", "ALL"],
+            description="Consistency level for writes to replicated collections.",
+        ),
+        th.Property(
+            "vectorizer_rate_limits",
+            th.ObjectType(),
+            required=False,
+            description=(
+                "Provider rate limits keyed by vectorizer name, used to pace batch submission. "
+                "Each entry accepts 'requests_per_minute' (batch requests sent to Weaviate, "
+                "each of which may become several provider calls), 'tokens_per_minute', "
+                "'text_fields' (properties sent to the vectorizer, default all text) "
+                "and 'max_retries' for rate limited objects. "
+                "Example: {'text2vec-openai': {'requests_per_minute': 3000, 'tokens_per_minute': 1000000}}"
+            ),
+        ),
+        th.Property(
+            "sync_run_property",
+            th.StringType,
+            required=False,
+            default="sync_run_id",
+            description="Property that stores the sync run identifier when load_method is 'sync-and-prune'.",
+        ),
+        th.Property(
+            "sync_stream_property",
+            th.StringType,
+            required=False,
+            default="sync_stream",
+            description=(
+                "Property that stores the name of the stream that wrote each object when "
+                "load_method is 'sync-and-prune'. Pruning only deletes the stream's own objects."
+            ),
+        ),
+        th.Property(
+            "prune_dry_run",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Only log how many stale objects 'sync-and-prune' would delete.",
+        ),
+        th.Property(
+            "prune_max_fraction",
+            th.NumberType,
+            required=False,
+            default=0.5,
+            description=(
+                "Skip pruning a stream if more than this fraction of the objects it wrote is stale, "
+                "to guard against deleting data after a partial extract."
+            ),
+        ),
+        th.Property(
+            "chunk_fields",
+            th.ArrayType(th.StringType),
+            required=False,
+            description=(
+                "Text properties to split into separate chunk objects before vectorization. "
+                "Requires load_method 'upsert' or 'sync-and-prune'."
+            ),
+        ),
+        th.Property(
+            "chunk_size",
+            th.IntegerType,
+            required=False,
+            default=2000,
+            description="Size of each chunk, in chunk_unit.",
+        ),
+        th.Property(
+            "chunk_overlap",
+            th.IntegerType,
+            required=False,
+            default=200,
+            description="Overlap between consecutive chunks, in chunk_unit.",
+        ),
+        th.Property(
+            "chunk_unit",
+            th.StringType,
+            required=False,
+            default="character",
+            allowed_values=["character", "token"],
+            description="Unit for chunk_size and chunk_overlap. Tokens are whitespace-delimited words.",
+        ),
+        th.Property(
+            "chunk_workers",
+            th.IntegerType,
+            required=False,
+            description="Number of processes used for chunking. Defaults to the number of CPUs; 1 chunks inline.",
+        ),
+        th.Property(
+            "chunk_parent_properties",
+            th.ArrayType(th.StringType),
+            required=False,
+            description=(
+                "Parent text properties copied into every chunk object. Other parent text is left "
+                "out of chunks, since each copy is sent to the vectorizer again."
+            ),
+        ),
+        th.Property(
+            "max_in_flight_batches",
+            th.IntegerType(minimum=1),
+            required=False,
+            default=8,
+            description="Maximum number of batches written concurrently across all streams when sinks are drained.",
+        ),
+        th.Property(
+            "max_in_flight_bytes",
+            th.IntegerType(minimum=1),
+            required=False,
+            description=(
+                "Maximum total size in bytes of the batches written concurrently across all streams. "
+                "A batch larger than this is written on its own."
+            ),
+        ),
+        th.Property(
+            "profile",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description=(
+                "Profile the run and write per-stream reports of the top functions and "
+                "allocation sites, plus a collapsed-stack file for flamegraphs."
+            ),
+        ),
+        th.Property(
+            "profile_dir",
+            th.StringType,
+            required=False,
+            default="profile",
+            description="Directory the profiling reports are written to.",
+        ),
     ).to_dict()
 
     default_sink_class = WeaviateSink
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.profiler = None
+        self.chunk_pool = None
+
+        # one pool for every stream, created before any connection or helper thread exists
+        if self.config.get("chunk_fields") and self.config.get("chunk_workers") != 1:
+            self.chunk_pool = create_chunk_pool(self.config.get("chunk_workers"))
+        self.max_parallelism = self.config.get("max_in_flight_batches", 8)
+
+        if self.config.get("profile"):
+            # profilers are per-thread, so drain sinks on the main thread
+            self.max_parallelism = 1
+            self.profiler = ProfileSession(self.config.get("profile_dir", "profile"), logger=self.logger)
+            self.profiler.start()
+
+        if self.profiler or self.chunk_pool:
+            # a failed run never reaches process_endofpipe, and its profile is the one worth reading
+            atexit.register(self.close)
+
+    def _process_record_message(self, message_dict: dict) -> None:
+        if self.profiler is None:
+            super()._process_record_message(message_dict)
+            return
+
+        with profile_stream(message_dict.get("stream", "target")):
+            super()._process_record_message(message_dict)
+
+    def _drain_all(self, sink_list, parallelism: int) -> None:
+        sinks = [sink for sink in sink_list if sink.current_size]
+        if parallelism == 1 or len(sinks) <= 1:
+            super()._drain_all(sinks, 1)
+            return
+
+        # smallest batches first, so one huge stream does not hold up the others
+        pending = sorted(((sink.pending_bytes(), sink) for sink in sinks), key=lambda item: item[0])
+        # the pool caps the number of batches in flight, the budget caps their bytes
+        budget = InFlightBudget(self.config.get("max_in_flight_bytes"))
+
+        def _drain_sink(size: int, sink: WeaviateSink) -> None:
+            with budget.reserve(size):
+                self.drain_one(sink)
+
+        with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="drain") as executor:
+            futures = [executor.submit(_drain_sink, size, sink) for size, sink in pending]
+        for future in futures:
+            future.result()
+
+    def process_endofpipe(self) -> None:
+        if self.config.get("load_method") == SYNC_AND_PRUNE:
+            # only prune once every stream has been fully written; drain without emitting
+            # state, which the final drain_all below writes once pruning is done
+            self._drain_all(self._sinks_to_clear, 1)
+            self._drain_all(self._sinks_active.values(), self.max_parallelism)
+            for sink in self._sinks_active.values():
+                sink.prune_stale_objects()
+
+        super().process_endofpipe()
+        self.close()
+
+    def close(self) -> None:
+        """Stop profiling, writing its reports, and shut down the chunking pool."""
+        atexit.unregister(self.close)
+        if self.profiler:
+            self.profiler.stop()
+            self.profiler = None
+        if self.chunk_pool:
+            self.chunk_pool.shutdown()
+            self.chunk_pool = None
+
 
 if __name__ == "__main__":
     TargetWeaviate.cli()
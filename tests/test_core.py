@@ -3,13 +3,21 @@
 from __future__ import annotations
 
 import hashlib
+import io
+import threading
+import tracemalloc
 import typing as t
 import uuid
 from pathlib import Path
 from unittest import mock
 
+import pytest
 from singer_sdk.testing import TargetTestRunner
+from weaviate.classes.config import DataType
 
+from target_weaviate.chunking import Chunker, chunk_uuid, create_chunk_pool, split_text
+from target_weaviate.flush import InFlightBudget
+from target_weaviate.rate_limit import VectorizerRateLimiter, estimate_tokens, is_rate_limit_error
 from target_weaviate.target import TargetWeaviate
 
 SAMPLE_CONFIG: dict[str, t.Any] = {
@@ -345,3 +353,527 @@ def test_add_record_metadata(mock_weaviate) -> None:
     runner.sync_all()
 
     assert mock_batch_context.add_object.call_count == 2
+
+
+@mock.patch("target_weaviate.rate_limit.time.sleep")
+@mock.patch("target_weaviate.client.weaviate")
+def test_vectorizer_rate_limit_retries_throttled_objects(mock_weaviate, mock_sleep) -> None:
+    """Test rate limited vectorizers pace batches and retry 429 errors."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = True
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+    mock_collection.config.get.return_value.vectorizer = "text2vec-openai"
+
+    throttled = mock.MagicMock()
+    throttled.message = "update vector: status code: 429, Rate limit reached for requests"
+    first_result = mock.MagicMock()
+    first_result.errors = {0: throttled}
+    retry_result = mock.MagicMock()
+    retry_result.errors = {}
+    mock_collection.data.insert_many.side_effect = [first_result, retry_result]
+
+    # the existing collection's vectorizer decides the limits, not the one used for new collections
+    config = SAMPLE_CONFIG.copy()
+    config["vectorizer"] = "text2vec-cohere"
+    config["vectorizer_rate_limits"] = {
+        "text2vec-openai": {"requests_per_minute": 600, "tokens_per_minute": 100000},
+    }
+
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_filepath=Path("tests/target_test_streams/test_stream.singer"),
+    )
+    runner.sync_all()
+
+    assert not mock_collection.batch.dynamic.called
+    assert not mock_collection.batch.fixed_size.called
+    first_objects, retry_objects = (call.args[0] for call in mock_collection.data.insert_many.call_args_list)
+    assert len(first_objects) == 2
+    assert [obj.uuid for obj in retry_objects] == [first_objects[0].uuid]
+    assert mock_sleep.called
+
+
+def test_rate_limiter_paces_requests() -> None:
+    """Test the token bucket waits for quota once it is exhausted."""
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = VectorizerRateLimiter(
+        requests_per_minute=60,
+        tokens_per_minute=600,
+        clock=lambda: now[0],
+        sleep=sleep,
+    )
+
+    limiter.acquire(600)
+    assert sleeps == []
+
+    limiter.acquire(300)
+    assert sum(sleeps) == 30.0
+
+
+def test_estimate_tokens_and_rate_limit_errors() -> None:
+    """Test token estimation only counts vectorized text fields."""
+    record = {"title": "a" * 40, "body": "b" * 400, "count": 12}
+
+    assert estimate_tokens(record) == 110
+    assert estimate_tokens(record, ["title"]) == 10
+    assert is_rate_limit_error("status code: 429, Too Many Requests")
+    assert not is_rate_limit_error("invalid property 'count'")
+
+
+@mock.patch("target_weaviate.client.weaviate")
+def test_sync_and_prune_deletes_stale_objects(mock_weaviate) -> None:
+    """Test sync-and-prune tags records with the run id and deletes older objects."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = True
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+    existing_property = mock.MagicMock()
+    existing_property.name = "item_id"
+    mock_collection.config.get.return_value.properties = [existing_property]
+
+    mock_aggregate = mock.MagicMock()
+    mock_aggregate.total_count = 10
+    mock_collection.aggregate.over_all.return_value = mock_aggregate
+
+    mock_delete = mock.MagicMock()
+    mock_delete.matches = 1
+    mock_delete.successful = 1
+    mock_delete.failed = 0
+    mock_done = mock.MagicMock()
+    mock_done.matches = 0
+    mock_done.successful = 0
+    mock_done.failed = 0
+    mock_collection.data.delete_many.side_effect = [mock_delete, mock_done]
+
+    mock_batch_context = mock.MagicMock()
+    mock_batch = mock.MagicMock()
+    mock_batch.dynamic.return_value.__enter__ = mock.MagicMock(return_value=mock_batch_context)
+    mock_batch.dynamic.return_value.__exit__ = mock.MagicMock(return_value=False)
+    mock_collection.batch = mock_batch
+
+    config = SAMPLE_CONFIG.copy()
+    config["load_method"] = "sync-and-prune"
+    config["prune_max_fraction"] = 1.0
+
+    lines = Path("tests/target_test_streams/test_stream.singer").read_text()
+    state = '{"type": "STATE", "value": {"bookmarks": {"test_stream": {"item_id": "456"}}}}\n'
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_io=io.StringIO(lines + state),
+    )
+    runner.sync_all()
+
+    # the existing collection gets the run id and stream properties declared with their real types
+    added = {call.args[0].name: call.args[0] for call in mock_collection.config.add_property.call_args_list}
+    assert set(added) == {"sync_run_id", "sync_stream"}
+    assert added["sync_run_id"].dataType == DataType.INT
+    assert added["sync_stream"].dataType == DataType.TEXT
+    assert added["sync_stream"].skip_vectorization
+
+    # state is emitted once, after pruning
+    assert len(runner.state_messages) == 1
+
+    assert mock_batch_context.add_object.call_count == 2
+    properties = mock_batch_context.add_object.call_args.kwargs["properties"]
+    assert "sync_run_id" in properties
+    assert properties["sync_stream"] == "test_stream"
+    assert mock_collection.data.delete_many.call_count == 2
+
+    where = mock_collection.data.delete_many.call_args.kwargs["where"]
+    conditions = {(f.target, f.operator.value) for f in where.filters}
+    assert conditions == {("sync_stream", "Equal"), ("sync_run_id", "LessThan")}
+    assert next(f.value for f in where.filters if f.target == "sync_stream") == "test_stream"
+
+
+@mock.patch("target_weaviate.client.weaviate")
+def test_sync_and_prune_respects_safety_threshold(mock_weaviate) -> None:
+    """Test sync-and-prune skips deletion when too much of the collection is stale."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = True
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+
+    mock_aggregate = mock.MagicMock()
+    mock_aggregate.total_count = 10
+    mock_collection.aggregate.over_all.return_value = mock_aggregate
+
+    mock_batch_context = mock.MagicMock()
+    mock_batch = mock.MagicMock()
+    mock_batch.dynamic.return_value.__enter__ = mock.MagicMock(return_value=mock_batch_context)
+    mock_batch.dynamic.return_value.__exit__ = mock.MagicMock(return_value=False)
+    mock_collection.batch = mock_batch
+
+    config = SAMPLE_CONFIG.copy()
+    config["load_method"] = "sync-and-prune"
+
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_filepath=Path("tests/target_test_streams/test_stream.singer"),
+    )
+    runner.sync_all()
+
+    assert mock_batch_context.add_object.call_count == 2
+    assert not mock_collection.data.delete_many.called
+
+
+@mock.patch("target_weaviate.client.weaviate")
+def test_collection_with_sharding_and_replication(mock_weaviate) -> None:
+    """Test creates collection with sharding and replication and writes with consistency level."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = False
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+    mock_collection.with_consistency_level.return_value = mock_collection
+
+    mock_batch_context = mock.MagicMock()
+    mock_batch = mock.MagicMock()
+    mock_batch.dynamic.return_value.__enter__ = mock.MagicMock(return_value=mock_batch_context)
+    mock_batch.dynamic.return_value.__exit__ = mock.MagicMock(return_value=False)
+    mock_collection.batch = mock_batch
+
+    config = SAMPLE_CONFIG.copy()
+    config["shard_count"] = 3
+    config["replication_factor"] = 2
+    config["consistency_level"] = "QUORUM"
+
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_filepath=Path("tests/target_test_streams/test_stream.singer"),
+    )
+    runner.sync_all()
+
+    create_kwargs = mock_collections.create.call_args.kwargs
+    assert create_kwargs["sharding_config"].desiredCount == 3
+    assert create_kwargs["replication_config"].factor == 2
+    assert mock_collection.with_consistency_level.called
+    assert mock_batch_context.add_object.call_count == 2
+
+
+@mock.patch("target_weaviate.client.weaviate")
+def test_profile_writes_reports(mock_weaviate, tmp_path) -> None:
+    """Test profiling mode writes per-stream reports and collapsed stacks."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = True
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+
+    mock_batch_context = mock.MagicMock()
+    mock_batch = mock.MagicMock()
+    mock_batch.dynamic.return_value.__enter__ = mock.MagicMock(return_value=mock_batch_context)
+    mock_batch.dynamic.return_value.__exit__ = mock.MagicMock(return_value=False)
+    mock_collection.batch = mock_batch
+
+    config = SAMPLE_CONFIG.copy()
+    config["profile"] = True
+    config["profile_dir"] = str(tmp_path)
+
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_filepath=Path("tests/target_test_streams/test_stream.singer"),
+    )
+    runner.sync_all()
+
+    report = (tmp_path / "test_stream.txt").read_text()
+    assert "functions by cumulative time" in report
+    assert "process_record" in report
+    assert "_batch_upsert" in report
+    assert (tmp_path / "stacks.collapsed").exists()
+    assert mock_batch_context.add_object.call_count == 2
+
+
+@mock.patch("target_weaviate.client.weaviate")
+def test_profile_writes_reports_when_run_fails(mock_weaviate, tmp_path) -> None:
+    """Test profiling stops and writes reports even if the run raises."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+    mock_client_instance.collections.exists.side_effect = RuntimeError("connection refused")
+
+    config = SAMPLE_CONFIG.copy()
+    config["profile"] = True
+    config["profile_dir"] = str(tmp_path)
+
+    with mock.patch("target_weaviate.target.atexit") as mock_atexit:
+        target = TargetWeaviate(config=config)
+    lines = Path("tests/target_test_streams/test_stream.singer").read_text()
+
+    with pytest.raises(RuntimeError, match="connection refused"):
+        target.listen(io.StringIO(lines))
+
+    # the run never reached process_endofpipe, so the exit handler does the cleanup
+    mock_atexit.register.assert_called_once_with(target.close)
+    target.close()
+
+    assert not tracemalloc.is_tracing()
+    assert target.profiler is None
+    assert (tmp_path / "test_stream.txt").exists()
+    assert (tmp_path / "stacks.collapsed").exists()
+
+
+@pytest.mark.parametrize("chunk_workers", [1, 2])
+@mock.patch("target_weaviate.client.weaviate")
+def test_chunk_fields_writes_chunks_and_deletes_orphans(mock_weaviate, chunk_workers) -> None:
+    """Test chunked fields are written as chunk objects and orphans are deleted."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = True
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+
+    mock_delete = mock.MagicMock()
+    mock_delete.matches = 0
+    mock_delete.successful = 0
+    mock_delete.failed = 0
+    mock_collection.data.delete_many.return_value = mock_delete
+
+    mock_batch_context = mock.MagicMock()
+    mock_batch = mock.MagicMock()
+    mock_batch.dynamic.return_value.__enter__ = mock.MagicMock(return_value=mock_batch_context)
+    mock_batch.dynamic.return_value.__exit__ = mock.MagicMock(return_value=False)
+    mock_collection.batch = mock_batch
+
+    config = SAMPLE_CONFIG.copy()
+    config["chunk_fields"] = ["description"]
+    config["chunk_size"] = 10
+    config["chunk_overlap"] = 2
+    config["chunk_workers"] = chunk_workers
+    config["chunk_parent_properties"] = ["title"]
+
+    pools = []
+
+    def _create_chunk_pool(workers):
+        pools.append(create_chunk_pool(workers))
+        return pools[-1]
+
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_filepath=Path("tests/target_test_streams/test_stream.singer"),
+    )
+    with mock.patch("target_weaviate.target.create_chunk_pool", side_effect=_create_chunk_pool):
+        runner.sync_all()
+
+    objects = [call.kwargs["properties"] for call in mock_batch_context.add_object.call_args_list]
+    parents = [obj for obj in objects if "parent_uuid" not in obj]
+    chunks = [obj for obj in objects if "parent_uuid" in obj]
+    assert len(parents) == 2
+    assert all("description" not in parent for parent in parents)
+    assert [chunk["chunk_index"] for chunk in chunks] == [0, 1, 2, 0, 1]
+    assert mock_collection.data.delete_many.call_count == 1
+
+    # only listed and non-text parent properties are copied, so chunks do not re-vectorize parent text
+    assert all(chunk["title"] and "category" not in chunk and "value" in chunk for chunk in chunks)
+    added = {call.args[0].name: call.args[0] for call in mock_collection.config.add_property.call_args_list}
+    assert set(added) == {"parent_uuid", "chunk_field", "chunk_index"}
+    assert added["chunk_field"].skip_vectorization
+
+    # the target shares one pool across streams and shuts it down at the end of the run
+    assert len(pools) == (0 if chunk_workers == 1 else 1)
+    for pool in pools:
+        with pytest.raises(RuntimeError):
+            pool.submit(len, "")
+
+
+@pytest.mark.parametrize(
+    ("chunk_size", "chunk_overlap"),
+    [(0, 0), (100, 200), (100, 100), (100, -1)],
+)
+def test_chunk_settings_are_validated(chunk_size, chunk_overlap) -> None:
+    """Test invalid chunk sizes and overlaps are rejected when the sink is created."""
+    config = SAMPLE_CONFIG.copy()
+    config["chunk_fields"] = ["description"]
+    config["chunk_size"] = chunk_size
+    config["chunk_overlap"] = chunk_overlap
+    config["chunk_workers"] = 1
+
+    target = TargetWeaviate(config=config)
+    with pytest.raises(ValueError, match="chunk_"):
+        target.add_sink("test_stream", {"properties": {"id": {"type": "integer"}}})
+
+
+def test_chunker_sends_only_long_texts_to_pool() -> None:
+    """Test texts that fit in one chunk are split inline instead of in the process pool."""
+    executor = mock.MagicMock()
+    executor.map.side_effect = lambda func, texts, chunksize: [func(text) for text in texts]
+    chunker = Chunker(["body"], chunk_size=10, chunk_overlap=0, executor=executor)
+
+    split = chunker.split([{"body": "short"}, {"id": 1}, {"body": "abcdefghijklmno"}])
+
+    assert split == [{"body": ["short"]}, {}, {"body": ["abcdefghij", "klmno"]}]
+    assert list(executor.map.call_args.args[1]) == ["abcdefghijklmno"]
+    assert executor.map.call_args.kwargs["chunksize"] > 1
+
+
+def test_split_text_windows() -> None:
+    """Test character and token windows overlap and cover the whole text."""
+    assert split_text("abcdefghij", 4, 1) == ["abcd", "defg", "ghij"]
+    assert split_text("one two three four five", 2, 1, unit="token") == [
+        "one two",
+        "two three",
+        "three four",
+        "four five",
+    ]
+
+    parent = uuid.UUID(hashlib.md5(b"123:alpha").hexdigest())
+    assert chunk_uuid(parent, "description", 0) == chunk_uuid(parent, "description", 0)
+    assert chunk_uuid(parent, "description", 0) != chunk_uuid(parent, "description", 1)
+
+
+@mock.patch("target_weaviate.client.weaviate")
+def test_drains_streams_concurrently(mock_weaviate) -> None:
+    """Test sinks for several streams are drained concurrently."""
+    mock_client_instance = mock.MagicMock()
+    mock_weaviate.connect_to_weaviate_cloud.return_value = mock_client_instance
+
+    mock_collections = mock.MagicMock()
+    mock_client_instance.collections = mock_collections
+    mock_collections.exists.return_value = True
+
+    mock_collection = mock.MagicMock()
+    mock_collections.get.return_value = mock_collection
+
+    drain_threads = set()
+    mock_batch_context = mock.MagicMock()
+    mock_batch_context.add_object.side_effect = lambda **_: drain_threads.add(threading.current_thread().name)
+    mock_batch = mock.MagicMock()
+    mock_batch.dynamic.return_value.__enter__ = mock.MagicMock(return_value=mock_batch_context)
+    mock_batch.dynamic.return_value.__exit__ = mock.MagicMock(return_value=False)
+    mock_collection.batch = mock_batch
+
+    lines = Path("tests/target_test_streams/test_stream.singer").read_text()
+    other_lines = lines.replace('"stream": "test_stream"', '"stream": "other_stream"')
+
+    config = SAMPLE_CONFIG.copy()
+    config.pop("collection_name")
+    config["max_in_flight_batches"] = 2
+    config["max_in_flight_bytes"] = 1000
+
+    runner = TargetTestRunner(
+        TargetWeaviate,
+        config=config,
+        input_io=io.StringIO(lines + other_lines),
+    )
+    runner.sync_all()
+
+    assert mock_batch_context.add_object.call_count == 4
+    assert drain_threads
+    assert all(name.startswith("drain") for name in drain_threads)
+
+
+def _reserve_in_thread(budget: InFlightBudget, size: int) -> tuple[threading.Event, threading.Event]:
+    """Hold a reservation in a thread until released; returns (admitted, release) events."""
+    admitted = threading.Event()
+    release = threading.Event()
+
+    def _hold() -> None:
+        with budget.reserve(size):
+            admitted.set()
+            release.wait()
+
+    threading.Thread(target=_hold, daemon=True).start()
+    return admitted, release
+
+
+def test_in_flight_budget_limits_bytes() -> None:
+    """Test a batch waits while it would exceed the byte budget."""
+    budget = InFlightBudget(max_bytes=100)
+
+    first_admitted, first_release = _reserve_in_thread(budget, 60)
+    assert first_admitted.wait(1)
+    fits_admitted, fits_release = _reserve_in_thread(budget, 40)
+    assert fits_admitted.wait(1)
+    over_admitted, over_release = _reserve_in_thread(budget, 50)
+    assert not over_admitted.wait(0.1)
+
+    first_release.set()
+    assert over_admitted.wait(1)
+
+    fits_release.set()
+    over_release.set()
+
+
+def test_in_flight_budget_runs_oversized_batch_alone() -> None:
+    """Test a batch larger than the byte budget waits for, then blocks, every other batch."""
+    budget = InFlightBudget(max_bytes=100)
+
+    small_admitted, small_release = _reserve_in_thread(budget, 10)
+    assert small_admitted.wait(1)
+    huge_admitted, huge_release = _reserve_in_thread(budget, 500)
+    assert not huge_admitted.wait(0.1)
+
+    small_release.set()
+    assert huge_admitted.wait(1)
+    next_admitted, next_release = _reserve_in_thread(budget, 10)
+    assert not next_admitted.wait(0.1)
+
+    huge_release.set()
+    assert next_admitted.wait(1)
+    next_release.set()
+
+
+def test_drain_schedules_smallest_batches_first() -> None:
+    """Test sinks are drained smallest batch first, limited by max_in_flight_batches."""
+    config = SAMPLE_CONFIG.copy()
+    config["max_in_flight_batches"] = 2
+    target = TargetWeaviate(config=config)
+
+    sinks = []
+    for name, size in (("huge", 10_000), ("small", 10), ("medium", 100)):
+        sink = mock.MagicMock(stream_name=name, current_size=1)
+        sink.pending_bytes.return_value = size
+        sinks.append(sink)
+
+    # the first two batches must run together before the third is started
+    started = []
+    both_running = threading.Barrier(2, timeout=1)
+
+    def _drain_one(sink) -> None:
+        started.append(sink.stream_name)
+        if sink.stream_name != "huge":
+            both_running.wait()
+
+    with mock.patch.object(target, "drain_one", side_effect=_drain_one):
+        target._drain_all(sinks, target.max_parallelism)
+
+    assert sorted(started[:2]) == ["medium", "small"]
+    assert started[2] == "huge"